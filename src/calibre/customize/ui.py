@@ -28,7 +28,7 @@ from calibre.customize import StoreBase as Store
 from calibre.customize.builtins import plugins as builtin_plugins
 from calibre.customize.conversion import InputFormatPlugin, OutputFormatPlugin
 from calibre.customize.profiles import InputProfile, OutputProfile
-from calibre.customize.zipplugin import loader
+from calibre.customize.zipplugin import close_plugin_zip, loader
 from calibre.devices.interface import DevicePlugin
 from calibre.ebooks.metadata import MetaInformation
 from calibre.ebooks.metadata.sources.base import Source
@@ -522,21 +522,27 @@ def can_set_metadata(ftype):
 
 def add_plugin(path_to_zip_file):
     make_config_dir()
-    plugin = load_plugin(path_to_zip_file)
-    if plugin.name in builtin_names:
-        raise NameConflict(
-            'A builtin plugin with the name %r already exists' % plugin.name)
-    if plugin.name in get_system_plugins():
-        raise NameConflict(
-            'A system plugin with the name %r already exists' % plugin.name)
-    plugin = initialize_plugin(plugin, path_to_zip_file, PluginInstallationType.EXTERNAL)
-    plugins = config['plugins']
-    zfp = os.path.join(plugin_dir, plugin.name+'.zip')
-    if os.path.exists(zfp):
-        os.remove(zfp)
-    shutil.copyfile(path_to_zip_file, zfp)
-    plugins[plugin.name] = zfp
-    config['plugins'] = plugins
+    try:
+        plugin = load_plugin(path_to_zip_file)
+        if plugin.name in builtin_names:
+            raise NameConflict(
+                'A builtin plugin with the name %r already exists' % plugin.name)
+        if plugin.name in get_system_plugins():
+            raise NameConflict(
+                'A system plugin with the name %r already exists' % plugin.name)
+        plugin = initialize_plugin(plugin, path_to_zip_file, PluginInstallationType.EXTERNAL)
+        plugins = config['plugins']
+        zfp = os.path.join(plugin_dir, plugin.name+'.zip')
+        close_plugin_zip(zfp)
+        if os.path.exists(zfp):
+            os.remove(zfp)
+        shutil.copyfile(path_to_zip_file, zfp)
+        plugins[plugin.name] = zfp
+        config['plugins'] = plugins
+    finally:
+        # The source is usually a temporary file that the caller deletes, do
+        # not keep anything loaded from it
+        close_plugin_zip(path_to_zip_file)
     initialize_plugins()
     return plugin
 
@@ -549,9 +555,11 @@ def remove_plugin(plugin_or_name):
         removed = True
         try:
             zfp = os.path.join(plugin_dir, name+'.zip')
+            close_plugin_zip(zfp)
             if os.path.exists(zfp):
                 os.remove(zfp)
             zfp = plugins[name]
+            close_plugin_zip(zfp)
             if os.path.exists(zfp):
                 os.remove(zfp)
         except:
@@ -12,14 +12,89 @@ import re
 import sys
 import threading
 import zipfile
-from collections import OrderedDict
+from collections import defaultdict
+from contextlib import contextmanager
 from functools import partial
 from importlib.machinery import ModuleSpec
 from importlib.util import decode_source
 
 from calibre import as_unicode
 from calibre.customize import InvalidPlugin, Plugin, PluginNotFound, numeric_version, platform
-from polyglot.builtins import itervalues, reload, string_or_bytes
+
+identifier_pat = re.compile(r'[a-zA-Z][_0-9a-zA-Z]*')
+_zip_handles = {}
+_zip_handles_lock = threading.RLock()
+_code_cache = {}
+_code_cache_mtimes = {}
+
+
+@contextmanager
+def hold_plugin_zip(zfp):
+    '''
+    Keep the plugin zip file at zfp open while loading a plugin, so that the
+    central directory of the zip file is parsed only once for all the
+    imports and resource loads of the load pass, rather than once for each.
+    '''
+    with _zip_handles_lock:
+        if zfp in _zip_handles:
+            yield
+            return
+        _zip_handles[zfp] = zipfile.ZipFile(zfp)
+    try:
+        yield
+    finally:
+        with _zip_handles_lock:
+            zf = _zip_handles.pop(zfp, None)
+        if zf is not None:
+            zf.close()
+
+
+@contextmanager
+def open_plugin_zip(zfp):
+    '''
+    Context manager giving a :class:`zipfile.ZipFile` for the plugin zip
+    file at zfp. Uses the handle from :func:`hold_plugin_zip` if there is
+    one, serializing access to it, otherwise the file is only open for the
+    duration.
+    '''
+    with _zip_handles_lock:
+        zf = _zip_handles.get(zfp)
+        if zf is not None:
+            yield zf
+            return
+    with zipfile.ZipFile(zfp) as zf:
+        yield zf
+
+
+def invalidate_code_cache(zfp):
+    '''
+    Forget compiled code and translations for modules from the plugin zip
+    file at zfp if the file has been modified since they were loaded.
+    '''
+    try:
+        mtime = os.stat(zfp).st_mtime
+    except OSError:
+        mtime = None
+    with _zip_handles_lock:
+        if _code_cache_mtimes.get(zfp) != mtime:
+            _code_cache_mtimes[zfp] = mtime
+            _translations_cache.pop(zfp, None)
+            for key in tuple(_code_cache):
+                if key[0] == zfp:
+                    del _code_cache[key]
+
+
+def close_plugin_zip(zfp):
+    '''
+    Close the handle held for the plugin zip file at zfp, if any, and
+    forget its translations. Must be called before the file is replaced or
+    deleted.
+    '''
+    with _zip_handles_lock:
+        zf = _zip_handles.pop(zfp, None)
+        _translations_cache.pop(zfp, None)
+    if zf is not None:
+        zf.close()
 
 
 def get_resources(zfp, name_or_list_of_names, print_tracebacks_for_missing_resources=True):
@@ -37,10 +112,10 @@ def get_resources(zfp, name_or_list_of_names, print_tracebacks_for_missing_resou
                 be just the bytes of the resource or None if it wasn't found.
     '''
     names = name_or_list_of_names
-    if isinstance(names, string_or_bytes):
+    if isinstance(names, (str, bytes)):
         names = [names]
     ans = {}
-    with zipfile.ZipFile(zfp) as zf:
+    with open_plugin_zip(zfp) as zf:
         for name in names:
             try:
                 ans[name] = zf.read(name)
@@ -74,7 +149,7 @@ def get_icons(zfp, name_or_list_of_names, plugin_name='', print_tracebacks_for_m
     '''
     from qt.core import QIcon, QPixmap
     ans = {}
-    namelist = [name_or_list_of_names] if isinstance(name_or_list_of_names, string_or_bytes) else name_or_list_of_names
+    namelist = [name_or_list_of_names] if isinstance(name_or_list_of_names, (str, bytes)) else name_or_list_of_names
     failed = set()
     if plugin_name:
         for name in namelist:
@@ -89,7 +164,7 @@ def get_icons(zfp, name_or_list_of_names, plugin_name='', print_tracebacks_for_m
         from_zfp = get_resources(zfp, list(failed), print_tracebacks_for_missing_resources=print_tracebacks_for_missing_resources)
         if from_zfp is None:
             from_zfp = {}
-        elif isinstance(from_zfp, string_or_bytes):
+        elif isinstance(from_zfp, (str, bytes)):
             from_zfp = {namelist[0]: from_zfp}
 
         for name in failed:
@@ -106,50 +181,116 @@ def get_icons(zfp, name_or_list_of_names, plugin_name='', print_tracebacks_for_m
 _translations_cache = {}
 
 
-def load_translations(namespace, zfp):
+class PluginTranslations:
+
+    '''
+    Holds the raw bytes of a plugin .mo file, read when the plugin calls
+    load_translations(), and parses them only when first needed. Reading
+    eagerly means the plugin zip file need not exist when _() is called.
+    '''
+
+    __slots__ = ('mo', 'trans')
+
+    def __init__(self, mo):
+        self.mo, self.trans = mo, None
+
+    def get(self):
+        if self.trans is None:
+            from gettext import GNUTranslations
+            from io import BytesIO
+            self.trans = GNUTranslations(BytesIO(self.mo))
+            self.mo = None
+        return self.trans
+
+
+def plugin_translations(zfp):
+    ''' Return the PluginTranslations for the plugin zip file at zfp or None if there are none '''
     null = object()
-    trans = _translations_cache.get(zfp, null)
-    if trans is None:
+    pt = _translations_cache.get(zfp, null)
+    if pt is not null:
+        return pt
+    from calibre.utils.localization import get_lang
+    lang = get_lang()
+    if not lang or lang == 'en':  # performance optimization
+        _translations_cache[zfp] = None
         return
-    if trans is null:
-        from calibre.utils.localization import get_lang
-        lang = get_lang()
-        if not lang or lang == 'en':  # performance optimization
+    with open_plugin_zip(zfp) as zf:
+        mo_path = f'translations/{lang}.mo'
+        if mo_path not in zf.NameToInfo and '_' in lang:
+            mo_path = f"translations/{lang.split('_')[0]}.mo"
+        if mo_path not in zf.NameToInfo:
             _translations_cache[zfp] = None
             return
-        with zipfile.ZipFile(zfp) as zf:
-            mo_path = zipfile.Path(zf, f"translations/{lang}.mo")
-            if not mo_path.exists() and "_" in lang:
-                mo_path = zipfile.Path(zf, f"translations/{lang.split('_')[0]}.mo")
-            if mo_path.exists():
-                mo = mo_path.read_bytes()
-            else:
-                _translations_cache[zfp] = None
-                return
+        mo = zf.read(mo_path)
+    pt = _translations_cache[zfp] = PluginTranslations(mo)
+    return pt
+
 
-        from gettext import GNUTranslations
-        from io import BytesIO
-        trans = _translations_cache[zfp] = GNUTranslations(BytesIO(mo))
+def translations_for_plugin(zfp):
+    ''' Return the GNUTranslations for the plugin zip file at zfp or None if there are none '''
+    pt = plugin_translations(zfp)
+    return None if pt is None else pt.get()
 
-    namespace['_'] = trans.gettext
-    namespace['ngettext'] = trans.ngettext
+
+class LazyTranslation:
+
+    '''
+    Stands in for _() or ngettext() in a plugin module namespace until
+    first called, so that the .mo file is only parsed if the plugin
+    actually uses translations. On first call it replaces itself in the
+    namespace with the real function.
+    '''
+
+    __slots__ = ('namespace', 'translations', 'name')
+
+    def __init__(self, namespace, translations, name):
+        self.namespace, self.translations, self.name = namespace, translations, name
+
+    def __call__(self, *args):
+        trans = self.translations.get()
+        func = trans.gettext if self.name == '_' else trans.ngettext
+        if self.namespace.get(self.name) is self:
+            self.namespace[self.name] = func
+        return func(*args)
+
+
+def load_translations(namespace, zfp):
+    # Plugins often call load_translations() in every module, make repeated
+    # calls for the same namespace free
+    if namespace.get('__plugin_translations_loaded_from__') == zfp:
+        return
+    namespace['__plugin_translations_loaded_from__'] = zfp
+    pt = plugin_translations(zfp)
+    if pt is None:
+        return
+    if pt.trans is None:
+        namespace['_'] = LazyTranslation(namespace, pt, '_')
+        namespace['ngettext'] = LazyTranslation(namespace, pt, 'ngettext')
+        return
+
+    namespace['_'] = pt.trans.gettext
+    namespace['ngettext'] = pt.trans.ngettext
 
 
 class CalibrePluginLoader:
 
     __slots__ = (
         'plugin_name', 'fullname_in_plugin', 'zip_file_path', '_is_package', 'names',
-        'filename', 'all_names'
+        'filename', 'children', 'all_names_set', 'base'
     )
 
-    def __init__(self, plugin_name, fullname_in_plugin, zip_file_path, names, filename, is_package, all_names):
+    def __init__(self, plugin_name, fullname_in_plugin, zip_file_path, names, filename, is_package, children, all_names_set, base):
         self.plugin_name = plugin_name
         self.fullname_in_plugin = fullname_in_plugin
         self.zip_file_path = zip_file_path
         self.names = names
         self.filename = filename
         self._is_package = is_package
-        self.all_names = all_names
+        self.children = children
+        self.all_names_set = all_names_set
+        # The directory in the zip file containing this module, None if the
+        # module is not in the zip file
+        self.base = base
 
     def __eq__(self, other):
         return (
@@ -167,6 +308,9 @@ class CalibrePluginLoader:
     def create_module(self, spec):
         pass
 
+    def _get_zip(self):
+        return open_plugin_zip(self.zip_file_path)
+
     def is_package(self, fullname):
         return self._is_package
 
@@ -175,7 +319,7 @@ class CalibrePluginLoader:
         if self.plugin_name and self.fullname_in_plugin and self.zip_file_path:
             zinfo = self.names.get(self.fullname_in_plugin)
             if zinfo is not None:
-                with zipfile.ZipFile(self.zip_file_path) as zf:
+                with self._get_zip() as zf:
                     try:
                         src = zf.read(zinfo)
                     except Exception:
@@ -191,8 +335,19 @@ class CalibrePluginLoader:
         return self.filename
 
     def get_code(self, fullname=None):
-        return compile(self.get_source_as_bytes(fullname), f'calibre_plugins.{self.plugin_name}.{self.fullname_in_plugin}',
+        key = None
+        if self.plugin_name and self.fullname_in_plugin and self.zip_file_path:
+            zinfo = self.names.get(self.fullname_in_plugin)
+            if zinfo is not None:
+                key = self.zip_file_path, self.plugin_name, self.fullname_in_plugin, zinfo.CRC, zinfo.file_size
+                ans = _code_cache.get(key)
+                if ans is not None:
+                    return ans
+        ans = compile(self.get_source_as_bytes(fullname), f'calibre_plugins.{self.plugin_name}.{self.fullname_in_plugin}',
             'exec', dont_inherit=True)
+        if key is not None:
+            _code_cache[key] = ans
+        return ans
 
     def exec_module(self, module):
         compiled = self.get_code()
@@ -202,6 +357,7 @@ class CalibrePluginLoader:
             module.__dict__['get_resources'] = partial(get_resources, zfp)
             module.__dict__['get_icons'] = partial(get_icons, zfp)
             module.__dict__['load_translations'] = partial(load_translations, module.__dict__, zfp)
+            module.__dict__.pop('__plugin_translations_loaded_from__', None)
         exec(compiled, module.__dict__)
 
     def resource_path(self, name):
@@ -209,39 +365,24 @@ class CalibrePluginLoader:
             f'{name} is not available as a filesystem path in calibre plugins')
 
     def contents(self):
-        if not self._is_package:
+        if not self._is_package or self.base is None:
             return ()
-        zinfo = self.names.get(self.fullname_in_plugin)
-        if zinfo is None:
-            return ()
-        base = posixpath.dirname(zinfo.filename)
-        if base:
-            base += '/'
-
-        def is_ok(x):
-            if not base or x.startswith(base):
-                rest = x[len(base):]
-                return '/' not in rest
-            return False
-
-        return tuple(filter(is_ok, self.all_names))
+        return self.children.get(self.base, ())
 
     def is_resource(self, name):
-        zinfo = self.names.get(self.fullname_in_plugin)
-        if zinfo is None:
+        if self.base is None:
             return False
-        base = posixpath.dirname(zinfo.filename)
-        q = posixpath.join(base, name)
-        return q in self.all_names
+        return posixpath.join(self.base, name) in self.all_names_set
 
     def open_resource(self, name):
-        zinfo = self.names.get(self.fullname_in_plugin)
-        if zinfo is None:
+        if self.base is None:
             raise FileNotFoundError(f'{self.fullname_in_plugin} not in plugin zip file')
-        base = posixpath.dirname(zinfo.filename)
-        q = posixpath.join(base, name)
-        with zipfile.ZipFile(self.zip_file_path) as zf:
-            return zf.open(q)
+        with self._get_zip() as zf:
+            return zf.open(posixpath.join(self.base, name))
+
+
+def module_depth(cls):
+    return (getattr(cls, '__module__', None) or '').count('.')
 
 
 class CalibrePluginFinder:
@@ -249,7 +390,6 @@ class CalibrePluginFinder:
     def __init__(self):
         self.loaded_plugins = {}
         self._lock = threading.RLock()
-        self._identifier_pat = re.compile(r'[a-zA-Z][_0-9a-zA-Z]*')
 
     def find_spec(self, fullname, path, target=None):
         if not fullname.startswith('calibre_plugins'):
@@ -257,14 +397,15 @@ class CalibrePluginFinder:
         parts = fullname.split('.')
         if parts[0] != 'calibre_plugins':
             return
-        plugin_name = fullname_in_plugin = zip_file_path = filename = None
-        all_names = frozenset()
-        names = OrderedDict()
+        plugin_name = fullname_in_plugin = zip_file_path = filename = base = None
+        children = {}
+        all_names_set = frozenset()
+        names = {}
 
         if len(parts) > 1:
             plugin_name = parts[1]
             with self._lock:
-                zip_file_path, names, all_names = self.loaded_plugins.get(plugin_name, (None, None, None))
+                zip_file_path, names, children, all_names_set = self.loaded_plugins.get(plugin_name, (None, None, None, None))
             if zip_file_path is None:
                 return
             fullname_in_plugin = '.'.join(parts[2:])
@@ -275,6 +416,7 @@ class CalibrePluginFinder:
                     fullname_in_plugin += '.__init__'
                 else:
                     return
+            base = posixpath.dirname(names[fullname_in_plugin].filename)
         is_package = bool(
             fullname.count('.') < 2 or
             fullname_in_plugin == '__init__' or
@@ -285,7 +427,8 @@ class CalibrePluginFinder:
 
         return ModuleSpec(
             fullname,
-            CalibrePluginLoader(plugin_name, fullname_in_plugin, zip_file_path, names, filename, is_package, all_names),
+            CalibrePluginLoader(
+                plugin_name, fullname_in_plugin, zip_file_path, names, filename, is_package, children, all_names_set, base),
             is_package=is_package, origin=filename
         )
 
@@ -293,7 +436,14 @@ class CalibrePluginFinder:
         if not os.access(path_to_zip_file, os.R_OK):
             raise PluginNotFound('Cannot access %r'%path_to_zip_file)
 
-        with zipfile.ZipFile(path_to_zip_file) as zf:
+        # The file may have been replaced since it was last loaded
+        close_plugin_zip(path_to_zip_file)
+        invalidate_code_cache(path_to_zip_file)
+        with hold_plugin_zip(path_to_zip_file):
+            return self._load(path_to_zip_file)
+
+    def _load(self, path_to_zip_file):
+        with open_plugin_zip(path_to_zip_file) as zf:
             plugin_name = self._locate_code(zf, path_to_zip_file)
 
         try:
@@ -301,19 +451,17 @@ class CalibrePluginFinder:
             plugin_module = 'calibre_plugins.%s'%plugin_name
             m = sys.modules.get(plugin_module, None)
             if m is not None:
-                reload(m)
+                importlib.reload(m)
             else:
                 m = importlib.import_module(plugin_module)
-            plugin_classes = []
-            for obj in itervalues(m.__dict__):
-                if isinstance(obj, type) and issubclass(obj, Plugin) and \
-                        obj.name != 'Trivial Plugin':
-                    plugin_classes.append(obj)
+            plugin_classes = [
+                obj for obj in vars(m).values() if isinstance(obj, type) and obj is not Plugin and
+                issubclass(obj, Plugin) and obj.name != 'Trivial Plugin']
             if not plugin_classes:
                 raise InvalidPlugin('No plugin class found in %s:%s'%(
                     as_unicode(path_to_zip_file), plugin_name))
             if len(plugin_classes) > 1:
-                plugin_classes.sort(key=lambda c:(getattr(c, '__module__', None) or '').count('.'))
+                plugin_classes.sort(key=module_depth)
 
             ans = plugin_classes[0]
 
@@ -335,14 +483,28 @@ class CalibrePluginFinder:
             raise
 
     def _locate_code(self, zf, path_to_zip_file):
-        all_names = frozenset(zf.namelist())
-        names = [x[1:] if x[0] == '/' else x for x in all_names]
-
         plugin_name = None
-        for name in names:
-            name, ext = posixpath.splitext(name)
-            if name.startswith('plugin-import-name-') and ext == '.txt':
-                plugin_name = name.rpartition('-')[-1]
+        all_names = []
+        # The files in each directory of the zip file, for contents()
+        children = {}
+        pynames = {}
+        # Package directories, bucketed by depth
+        candidates = defaultdict(list)
+        for zi in zf.infolist():
+            x = zi.filename
+            all_names.append(x)
+            parent, base = posixpath.split(x)
+            if base:
+                children.setdefault(parent, []).append(base)
+            if x[0] == '/':
+                x = x[1:]
+            if x.endswith('.py'):
+                pynames[x] = zi
+                if x.endswith('/__init__.py'):
+                    parts = x.split('/')[:-1]
+                    candidates[len(parts)].append(parts)
+            elif x.startswith('plugin-import-name-') and x.endswith('.txt'):
+                plugin_name = x[:-4].rpartition('-')[-1]
 
         if plugin_name is None:
             c = 0
@@ -352,34 +514,28 @@ class CalibrePluginFinder:
                 if plugin_name not in self.loaded_plugins:
                     break
         else:
-            if self._identifier_pat.match(plugin_name) is None:
+            if identifier_pat.match(plugin_name) is None:
                 raise InvalidPlugin(
                     'The plugin at %r uses an invalid import name: %r' %
                     (path_to_zip_file, plugin_name))
 
-        pynames = [x for x in names if x.endswith('.py')]
-
-        candidates = [posixpath.dirname(x) for x in pynames if
-                x.endswith('/__init__.py')]
-        candidates.sort(key=lambda x: x.count('/'))
+        # A package is only valid if its parent package is, so visit
+        # shallower packages first
         valid_packages = set()
+        for depth in sorted(candidates):
+            for parts in candidates[depth]:
+                parent = '.'.join(parts[:-1])
+                if not parent or parent in valid_packages:
+                    valid_packages.add('.'.join(parts))
 
-        for candidate in candidates:
-            parts = candidate.split('/')
-            parent = '.'.join(parts[:-1])
-            if parent and parent not in valid_packages:
-                continue
-            valid_packages.add('.'.join(parts))
-
-        names = OrderedDict()
+        names = {}
 
-        for candidate in pynames:
-            parts = posixpath.splitext(candidate)[0].split('/')
+        for candidate, zi in pynames.items():
+            parts = candidate[:-3].split('/')
             package = '.'.join(parts[:-1])
             if package and package not in valid_packages:
                 continue
-            name = '.'.join(parts)
-            names[name] = zf.getinfo(candidate)
+            names['.'.join(parts)] = zi
 
         # Legacy plugins
         if '__init__' not in names:
@@ -393,8 +549,10 @@ class CalibrePluginFinder:
                     'contain a top-level __init__.py file')
                     % path_to_zip_file)
 
+        children = {k: tuple(v) for k, v in children.items()}
+
         with self._lock:
-            self.loaded_plugins[plugin_name] = path_to_zip_file, names, tuple(all_names)
+            self.loaded_plugins[plugin_name] = path_to_zip_file, names, children, frozenset(all_names)
 
         return plugin_name
 
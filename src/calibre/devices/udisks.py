@@ -8,27 +8,51 @@ __docformat__ = 'restructuredtext en'
 import os
 import re
 from contextlib import suppress
+from functools import lru_cache
+
+mangled_pat = re.compile(rb'\\([0-7]{3})')
+
+
+def de_mangle(raw):
+    # The kernel escapes space, tab, newline and backslash as \ooo octal
+    return mangled_pat.sub(lambda m: bytes((int(m.group(1), 8),)), raw).decode('utf-8')
+
+
+mounts_cache = b'', {}
 
 
 def node_mountpoint(node):
+    global mounts_cache
 
     if isinstance(node, str):
         node = node.encode('utf-8')
 
-    def de_mangle(raw):
-        return raw.replace(b'\\040', b' ').replace(b'\\011', b'\t').replace(b'\\012',
-                b'\n').replace(b'\\0134', b'\\').decode('utf-8')
-
     with open('/proc/mounts', 'rb') as src:
-        for line in src.readlines():
-            line = line.split()
-            if line[0] == node:
-                return de_mangle(line[1])
-    return None
-
-
+        data = src.read()
+    # The mtime of /proc/mounts does not change when the mount table does,
+    # so re-use the previous parse only if the contents are unchanged
+    raw, mounts = mounts_cache
+    if data != raw:
+        mounts = {}
+        for line in data.splitlines():
+            parts = line.split(b' ', 2)
+            if len(parts) > 1:
+                mounts.setdefault(parts[0], parts[1])
+        mounts_cache = data, mounts
+    mp = mounts.get(node)
+    return None if mp is None else de_mangle(mp)
+
+
+def decode_device_path(raw):
+    # The Device property is a NUL terminated byte array
+    if not isinstance(raw, bytes):
+        raw = bytes(raw)
+    return raw.rstrip(b'\x00').decode('utf-8')
+
+
+@lru_cache(maxsize=1)
 def basic_mount_options():
-    return ['rw', 'noexec', 'nosuid', 'nodev', 'uid=%d'%os.geteuid(), 'gid=%d'%os.getegid()]
+    return ('rw', 'noexec', 'nosuid', 'nodev', 'uid=%d'%os.geteuid(), 'gid=%d'%os.getegid())
 
 
 class UDisks:
@@ -42,6 +66,8 @@ class UDisks:
     def __enter__(self):
         from jeepney.io.blocking import open_dbus_connection
         self.connection = open_dbus_connection(bus='SYSTEM')
+        self.block_devices = None
+        self.device_cache = {}
         return self
 
     def __exit__(self, *args):
@@ -69,17 +95,37 @@ class UDisks:
         from jeepney import Properties
         p = Properties(self.address(f'block_devices/{devname}', self.BLOCK))
         r = self.send(p.get('Device'))
-        return bytearray(r.body[0][1]).replace(b'\x00', b'').decode('utf-8')
+        return decode_device_path(r.body[0][1])
+
+    def enumerate_block_devices(self):
+        # A single GetManagedObjects call returns the properties of all
+        # block devices, the result is cached till the next filesystem
+        # operation
+        if self.block_devices is None:
+            from jeepney import DBusAddress, new_method_call
+            a = DBusAddress(self.PATH, bus_name=self.BUS_NAME, interface='org.freedesktop.DBus.ObjectManager')
+            r = self.send(new_method_call(a, 'GetManagedObjects'))
+            prefix = f'{self.PATH}/block_devices/'
+            ans = {}
+            for object_path, interfaces in r.body[0].items():
+                if object_path.startswith(prefix):
+                    with suppress(Exception):
+                        raw = interfaces[self.BLOCK]['Device'][1]
+                        ans[object_path[len(prefix):]] = decode_device_path(raw)
+            self.block_devices = ans
+        return self.block_devices
 
     def iter_block_devices(self):
-        xml = self.introspect('block_devices')
-        for m in re.finditer(r'name=[\'"](.+?)[\'"]', xml):
-            devname = m.group(1)
-            with suppress(Exception):
-                yield devname, self.get_device_node_path(devname)
+        yield from self.enumerate_block_devices().items()
 
     def device(self, device_node_path):
         device_node_path = os.path.realpath(device_node_path)
+        ans = self.device_cache.get(device_node_path)
+        if ans is None:
+            self.device_cache[device_node_path] = ans = self.find_device(device_node_path)
+        return ans
+
+    def find_device(self, device_node_path):
         devname = device_node_path.split('/')[-1]
         # First try the device name directly
         with suppress(Exception):
@@ -94,6 +140,7 @@ class UDisks:
     def filesystem_operation_message(self, device_node_path, function_name, **kw):
         from jeepney import new_method_call
         devname = self.device(device_node_path)
+        self.block_devices = None
         a = self.address(f'block_devices/{devname}', self.FILESYSTEM)
         kw['auth.no_user_interaction'] = ('b', True)
         return new_method_call(a, function_name, 'a{sv}', (kw,))
@@ -112,6 +159,7 @@ class UDisks:
     def unmount(self, device_node_path):
         msg = self.filesystem_operation_message(device_node_path, 'Unmount', force=('b', True))
         self.send(msg)
+        self.device_cache.pop(os.path.realpath(device_node_path), None)
 
     def drive_for_device(self, device_node_path):
         from jeepney import Properties
@@ -124,29 +172,44 @@ class UDisks:
     def eject(self, device_node_path):
         from jeepney import new_method_call
         drive = self.drive_for_device(device_node_path)
+        self.block_devices = None
         a = self.address(drive, self.DRIVE)
         msg = new_method_call(a, 'Eject', 'a{sv}', ({
             'auth.no_user_interaction': ('b', True),
         },))
         self.send(msg)
+        self.device_cache.pop(os.path.realpath(device_node_path), None)
 
 
 def get_udisks():
     return UDisks()
 
 
-def mount(node_path):
-    with get_udisks() as u:
+# The functions below accept an optional already entered UDisks instance, so
+# that callers performing several operations can share one DBus connection
+
+
+def mount(node_path, u=None):
+    if u is None:
+        with get_udisks() as u:
+            u.mount(node_path)
+    else:
         u.mount(node_path)
 
 
-def eject(node_path):
-    with get_udisks() as u:
+def eject(node_path, u=None):
+    if u is None:
+        with get_udisks() as u:
+            u.eject(node_path)
+    else:
         u.eject(node_path)
 
 
-def umount(node_path):
-    with get_udisks() as u:
+def umount(node_path, u=None):
+    if u is None:
+        with get_udisks() as u:
+            u.unmount(node_path)
+    else:
         u.unmount(node_path)
 
 
@@ -16,6 +16,7 @@ import subprocess
 import sys
 import time
 from collections import namedtuple
+from contextlib import ExitStack
 from itertools import repeat
 
 from calibre import prints
@@ -764,19 +765,25 @@ class Device(DeviceConfig, DevicePlugin):
                     pass
 
     def eject_linux(self):
-        from calibre.devices.udisks import eject, umount
+        from calibre.devices.udisks import eject, get_udisks, umount
         drives = [d for d in self.find_device_nodes() if d]
-        for d in drives:
+        with ExitStack() as stack:
             try:
-                umount(d)
-            except:
-                pass
-        for d in drives:
-            try:
-                eject(d)
-            except Exception as e:
-                print('Udisks eject call for:', d, 'failed:')
-                print('\t', e)
+                u = stack.enter_context(get_udisks())
+            except Exception:
+                # Let each call below try to connect on its own
+                u = None
+            for d in drives:
+                try:
+                    umount(d, u)
+                except:
+                    pass
+            for d in drives:
+                try:
+                    eject(d, u)
+                except Exception as e:
+                    print('Udisks eject call for:', d, 'failed:')
+                    print('\t', e)
 
     def eject(self):
         if islinux:
@@ -6,12 +6,12 @@ __copyright__ = '2010, Kovid Goyal <kovid@kovidgoyal.net>'
 __docformat__ = 'restructuredtext en'
 
 from functools import partial
-from zipfile import ZipFile
 
 from qt.core import QAction, QIcon, QKeySequence, QMenu, QObject, QPoint, QTimer, QToolButton
 
 from calibre import prints
 from calibre.constants import ismacos
+from calibre.customize.zipplugin import open_plugin_zip
 from calibre.gui2 import Dispatcher
 from calibre.gui2.keyboard import NameConflict
 from polyglot.builtins import string_or_bytes
@@ -19,17 +19,30 @@ from polyglot.builtins import string_or_bytes
 
 def toolbar_widgets_for_action(gui, action):
     # Search the toolbars for the widget associated with an action, passing
-    # them to the caller for further processing
-    for x in gui.bars_manager.bars:
+    # them to the caller for further processing. The widgets are cached by
+    # the bars manager until the toolbars are rebuilt.
+    bars_manager = gui.bars_manager
+    cache = bars_manager.toolbar_widgets_cache
+    widgets = cache.get(action)
+    if widgets is None:
+        widgets = cache[action] = []
+        for x in bars_manager.bars:
+            try:
+                w = x.widgetForAction(action)
+            except Exception:
+                continue
+            if w is not None:
+                widgets.append(w)
+    for w in widgets:
         try:
-            w = x.widgetForAction(action)
+            # The button might be hidden. Check this first as it is cheaper
+            # than constructing a QPoint.
+            if not w.isVisible():
+                continue
             # It seems that multiple copies of the action can exist, such as
             # when the device-connected menu is changed while the device is
             # connected. Use the one that has an actual position.
-            if w is None or w.pos().x() == 0:
-                continue
-            # The button might be hidden
-            if not w.isVisible():
+            if w.pos().x() == 0:
                 continue
             yield(w)
         except Exception:
@@ -46,28 +59,27 @@ def show_menu_under_widget(gui, menu, action, name):
         except Exception:
             continue
     # Now try the menu bar
-    for x in gui.bars_manager.menu_bar.added_actions:
+    for x in gui.bars_manager.menu_bar.actions_for_text(name):
         # This depends on no two menus with the same name.
         # I don't know if this works on a Mac
-        if x.text() == name:
-            try:
-                # The menu item might be hidden
-                if not x.isVisible():
-                    continue
-                # We can't use x.trigger() because it doesn't put the menu
-                # in the right place. Instead get the position of the menu
-                # widget on the menu bar
-                p = x.parent().menu_bar
-                r = p.actionGeometry(x)
-                # Make sure that the menu item is actually displayed in the menu
-                # and not the overflow
-                if p.geometry().width() < (r.x() + r.width()):
-                    continue
-                # Show the menu under the name in the menu bar
-                menu.exec(p.mapToGlobal(QPoint(r.x()+2, r.height()-2)))
-                return
-            except Exception:
+        try:
+            # The menu item might be hidden
+            if not x.isVisible():
                 continue
+            # We can't use x.trigger() because it doesn't put the menu
+            # in the right place. Instead get the position of the menu
+            # widget on the menu bar
+            p = x.parent().menu_bar
+            r = p.actionGeometry(x)
+            # Make sure that the menu item is actually displayed in the menu
+            # and not the overflow
+            if p.geometry().width() < (r.x() + r.width()):
+                continue
+            # Show the menu under the name in the menu bar
+            menu.exec(p.mapToGlobal(QPoint(r.x()+2, r.height()-2)))
+            return
+        except Exception:
+            continue
     # No visible button found. Fall back to displaying in upper left corner
     # of the library view.
     menu.exec(gui.library_view.mapToGlobal(QPoint(10, 10)))
@@ -154,9 +166,9 @@ class InterfaceAction(QObject):
     #: See :attr:`all_locations` for a list of possible locations
     dont_remove_from = frozenset()
 
-    all_locations = frozenset(['toolbar', 'toolbar-device', 'context-menu',
+    all_locations = frozenset({'toolbar', 'toolbar-device', 'context-menu',
         'context-menu-device', 'toolbar-child', 'menubar', 'menubar-device',
-        'context-menu-cover-browser', 'context-menu-split', 'searchbar'])
+        'context-menu-cover-browser', 'context-menu-split', 'searchbar'})
 
     #: Type of action
     #: 'current' means acts on the current view
@@ -207,10 +219,19 @@ class InterfaceAction(QObject):
 
     @property
     def unique_name(self):
+        # Cached as it is used as a prefix for every shortcut this action
+        # registers. It only becomes available once
+        # interface_action_base_plugin has been set, which happens once,
+        # before genesis.
+        try:
+            return self._unique_name
+        except AttributeError:
+            pass
         bn = self.__class__.__name__
         if getattr(self.interface_action_base_plugin, 'name'):
             bn = self.interface_action_base_plugin.name
-        return 'Interface Action: %s (%s)'%(bn, self.name)
+        self._unique_name = ans = 'Interface Action: %s (%s)'%(bn, self.name)
+        return ans
 
     def create_action(self, spec=None, attr='qaction', shortcut_name=None, persist_shortcut=False):
         if spec is None:
@@ -221,18 +242,18 @@ class InterfaceAction(QObject):
         else:
             action = QAction(text, self.gui)
         if attr == 'qaction':
-            if hasattr(self.action_menu_clone_qaction, 'rstrip'):
-                mt = str(self.action_menu_clone_qaction)
+            if isinstance(self.action_menu_clone_qaction, str):
+                mt = self.action_menu_clone_qaction
             else:
                 mt = action.text()
             self.menuless_qaction = ma = QAction(action.icon(), mt, self.gui)
             ma.triggered.connect(action.trigger)
+        hover_text = tooltip if tooltip else text
         for a in ((action, ma) if attr == 'qaction' else (action,)):
             a.setAutoRepeat(self.auto_repeat)
-            text = tooltip if tooltip else text
-            a.setToolTip(text)
-            a.setStatusTip(text)
-            a.setWhatsThis(text)
+            a.setToolTip(hover_text)
+            a.setStatusTip(hover_text)
+            a.setWhatsThis(hover_text)
         shortcut_action = action
         desc = tooltip if tooltip else None
         if attr == 'qaction':
@@ -309,25 +330,24 @@ class InterfaceAction(QObject):
             ```persist_shortcut``` is set True.
 
         '''
-        if shortcut_name is None:
-            shortcut_name = str(text)
         ac = menu.addAction(text)
         if icon is not None:
             if not isinstance(icon, QIcon):
                 icon = QIcon.ic(icon)
             ac.setIcon(icon)
-        keys = ()
-        if shortcut is not None and shortcut is not False:
-            keys = ((shortcut,) if isinstance(shortcut, string_or_bytes) else
-                    tuple(shortcut))
-        unique_name = menu_action_unique_name(self, unique_name)
         if description is not None:
             ac.setToolTip(description)
             ac.setStatusTip(description)
             ac.setWhatsThis(description)
 
-        ac.calibre_shortcut_unique_name = unique_name
+        ac.calibre_shortcut_unique_name = unique_name = menu_action_unique_name(self, unique_name)
         if shortcut is not False:
+            if shortcut_name is None:
+                shortcut_name = str(text)
+            keys = ()
+            if shortcut is not None:
+                keys = ((shortcut,) if isinstance(shortcut, string_or_bytes) else
+                        tuple(shortcut))
             self.gui.keyboard.register_shortcut(unique_name,
                 shortcut_name, default_keys=keys,
                 action=ac, description=description, group=self.action_spec[0],
@@ -361,10 +381,12 @@ class InterfaceAction(QObject):
         if self.plugin_path is None:
             raise ValueError('This plugin was not loaded from a ZIP file')
         ans = {}
-        with ZipFile(self.plugin_path, 'r') as zf:
-            for candidate in zf.namelist():
-                if candidate in names:
-                    ans[candidate] = zf.read(candidate)
+        with open_plugin_zip(self.plugin_path) as zf:
+            for name in names:
+                try:
+                    ans[name] = zf.read(name)
+                except KeyError:
+                    pass
         return ans
 
     def genesis(self):
@@ -6,10 +6,11 @@ __copyright__ = '2010, Kovid Goyal <kovid@kovidgoyal.net>'
 __docformat__ = 'restructuredtext en'
 
 
+from functools import partial
+
 from qt.core import QToolButton
 
 from calibre.gui2.actions import InterfaceAction
-from calibre.startup import connect_lambda
 from calibre.utils.icu import lower as icu_lower
 from polyglot.builtins import string_or_bytes
 
@@ -23,6 +24,10 @@ class SimilarBooksAction(InterfaceAction):
     action_add_menu = True
 
     def genesis(self):
+        # The configured search keys are lowercased with ICU on every use,
+        # remember the results. The search term to field mapping itself is
+        # not cached, as grouped search terms can be edited at any time.
+        self.lowered_search_keys = {}
         m = self.qaction.menu()
         for text, icon, target, shortcut in [
         (_('Books by same author'), 'user_profile.png', 'authors', 'Alt+A'),
@@ -34,15 +39,15 @@ class SimilarBooksAction(InterfaceAction):
                     attr=target)
             ac.setObjectName(target)
             m.addAction(ac)
-            connect_lambda(ac.triggered, self, lambda self: self.show_similar_books(self.gui.sender().objectName()))
-        self.qaction.setMenu(m)
+            ac.triggered.connect(partial(self.show_similar_books, target))
 
     def show_similar_books(self, typ, *args):
         idx = self.gui.library_view.currentIndex()
         if not idx.isValid():
             return
         db = idx.model().db
-        row = idx.row()
+        api = db.new_api
+        book_id = idx.model().id(idx)
 
         # Get the parameters for this search
         key = 'similar_' + typ + '_search_key'
@@ -53,33 +58,35 @@ class SimilarBooksAction(InterfaceAction):
         else:
             join = ' or '
 
-        # Get all the data for the current record
-        mi = db.get_metadata(row)
-
         # Get the definitive field name to use for this search. If the field
         # is a grouped search term, the function returns the list of fields that
         # are to be searched, otherwise it returns the field name.
-        loc = db.field_metadata.search_term_to_field_key(icu_lower(col))
+        lcol = self.lowered_search_keys.get(col)
+        if lcol is None:
+            lcol = self.lowered_search_keys[col] = icu_lower(col)
+        loc = db.field_metadata.search_term_to_field_key(lcol)
         if isinstance(loc, list):
             # Grouped search terms are a list of fields. Get all the values,
             # pruning duplicates
             val = set()
             for f in loc:
-                v = mi.get(f, None)
+                v = api.field_for(f, book_id)
                 if not v:
                     continue
-                v = db.new_api.split_if_is_multiple_composite(f, v)
-                if isinstance(v, list):
+                v = api.split_if_is_multiple_composite(f, v)
+                if isinstance(v, (list, tuple)):
                     val.update(v)
                 else:
                     val.add(v)
         else:
             # Get the value of the requested field. Can be a list or a simple
             # val. It is possible that col no longer exists, in which case fall
-            # back to the default
-            if col not in mi.all_field_keys():
+            # back to the default. Only the needed field is read, rather than
+            # the full metadata of the book.
+            if col not in api.field_metadata:
                 col = db.prefs.defaults[key]
-            val = mi.get(col, None)
+            # title_sort is stored in the database as the sort field
+            val = api.field_for('sort' if col == 'title_sort' else col, book_id)
         if not val:
             return
         
@@ -93,12 +100,13 @@ class SimilarBooksAction(InterfaceAction):
         if typ == 'series':
             pre_string = col + ':"=.'
             string = val[0].replace('"', '\\"')
-            if string.find('.') >0 :
-                string = string[:string.find('.')]
+            head, sep, tail = string.partition('.')
+            if sep and head:
+                string = head
             search = [pre_string + string+'"']
 
         else:
-            search = [col + ':"='+t.replace('"', '\\"')+'"' for t in val]
+            search = [f'{col}:"={t}"' for t in (x.replace('"', '\\"') for x in val)]
         
         
         
@@ -458,6 +458,7 @@ if ismacos:
             self.gui = parent
             self.location_manager = location_manager
             self.added_actions = []
+            self.actions_by_text = None
             self.last_actions = []
 
             self.donate_action = QAction(_('Donate'), self)
@@ -487,6 +488,7 @@ if ismacos:
                 ac(_('Select all'), QKeySequence.StandardKey.SelectAll),
                 mb.addAction(self.edit_action)
                 self.added_actions = [self.edit_action]
+                self.actions_by_text = None
             else:
                 self.refresh_bar()
 
@@ -502,6 +504,7 @@ if ismacos:
                     ac.setMenu(None)
                     ac.deleteLater()
             self.added_actions = []
+            self.actions_by_text = None
 
         def init_bar(self, actions):
             mb = self.native_menubar
@@ -532,10 +535,22 @@ if ismacos:
             # 'Untitled' and the Location Manager items do not work.
             ans.text_changed.connect(self.refresh_timer.start)
             ans.visibility_changed.connect(self.refresh_timer.start)
+            ans.changed.connect(self.clear_actions_by_text)
             self.native_menubar.addAction(ans)
             self.added_actions.append(ans)
+            self.actions_by_text = None
             return ans
 
+        def clear_actions_by_text(self):
+            self.actions_by_text = None
+
+        def actions_for_text(self, text):
+            if self.actions_by_text is None:
+                self.actions_by_text = {}
+                for ac in self.added_actions:
+                    self.actions_by_text.setdefault(ac.text(), []).append(ac)
+            return self.actions_by_text.get(text, ())
+
         def setVisible(self, yes):
             pass  # no-op on OS X since menu bar is always visible
 
@@ -572,6 +587,7 @@ else:
 
             self.location_manager = location_manager
             self.added_actions = []
+            self.actions_by_text = None
 
             self.donate_action = QAction(_('Donate'), self)
             self.donate_menu = QMenu()
@@ -595,6 +611,7 @@ else:
 
             self.clear()
             self.added_actions = []
+            self.actions_by_text = None
 
             for what in actions:
                 if what is None:
@@ -620,8 +637,20 @@ else:
                 m = QMenu()
                 m.addAction(action)
             ac.setMenu(m)
+            ac.changed.connect(self.clear_actions_by_text)
             return ac
 
+        def clear_actions_by_text(self):
+            self.actions_by_text = None
+
+        def actions_for_text(self, text):
+            # The menu bar actions with the specified text, in menu bar order
+            if self.actions_by_text is None:
+                self.actions_by_text = {}
+                for ac in self.added_actions:
+                    self.actions_by_text.setdefault(ac.text(), []).append(ac)
+            return self.actions_by_text.get(text, ())
+
         def update_lm_actions(self):
             for ac in self.added_actions:
                 clone = getattr(ac, 'clone', None)
@@ -756,6 +785,7 @@ class BarsManager(QObject):
 
         self.apply_settings()
         self.search_tool_bar_actions = []
+        self.toolbar_widgets_cache = {}
         self.init_bars()
 
     def database_changed(self, db):
@@ -779,6 +809,7 @@ class BarsManager(QObject):
                 return True
 
     def init_bars(self):
+        self.toolbar_widgets_cache.clear()
         self.bar_actions = tuple([
             gprefs['action-layout-toolbar'+x] for x in ('', '-device')] + [
             gprefs['action-layout-toolbar-child']] + [
@@ -27,7 +27,7 @@ from qt.core import (
     QToolButton,
     QUrl,
 )
-from calibre.gui2.my_customised import ScrollTopButton, Spacer
+
 from calibre.constants import get_appname_for_display, get_version, ismacos
 from calibre.customize.ui import find_plugin
 from calibre.gui2 import config, error_dialog, gprefs, open_local_file, open_url
@@ -548,6 +548,8 @@ class LayoutMixin:  # {{{
         self.card_b_view = DeviceBooksView(self)
         self.stack.addWidget(self.card_b_view)
         self.card_b_view.setObjectName('card_b_view')
+        # The views in the order of their pages in self.stack
+        self.stack_views = (self.library_view, self.memory_view, self.card_a_view, self.card_b_view)
 
         # This must use the base method to find the plugin because it hasn't
         # been fully initialized yet
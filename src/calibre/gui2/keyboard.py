@@ -162,7 +162,7 @@ class Manager(QObject):  # {{{
                 'persist_shortcut':persist_shortcut}
         self.shortcuts[unique_name] = shortcut
         group = group if group else pgettext('keyboard shortcuts', _('Miscellaneous'))
-        self.groups[group] = self.groups.get(group, []) + [unique_name]
+        self.groups.setdefault(group, []).append(unique_name)
 
     def unregister_shortcut(self, unique_name):
         '''
@@ -1,44 +1,61 @@
-from qt.core import QToolButton, QIcon, Qt, QWidget, QAction
 from qt.core import (
-    QAction, QApplication, QCheckBox, QDialog, QDialogButtonBox, QGridLayout, QIcon,
-    QKeySequence, QLabel, QPainter, QPlainTextEdit, QSize, QSizePolicy, Qt,
-    QTextBrowser, QTextDocument, QVBoxLayout, QWidget, pyqtSignal,
+    QAction,
+    QCheckBox,
+    QDialog,
+    QDialogButtonBox,
+    QGridLayout,
+    QIcon,
+    QKeySequence,
+    QLabel,
+    QPlainTextEdit,
+    QShortcut,
+    Qt,
+    QTextBrowser,
+    QTimer,
+    QToolButton,
+    QWidget,
+    pyqtSignal,
 )
-from calibre.gui2.dialogs.message_box import Icon
 
-class ScrollTopButton(QToolButton):
+from calibre.gui2 import open_local_file
 
-    def __init__(self, gui):
 
-        sc = 'T'
+def scroll_top_action(gui):
+    '''
+    Create the action that scrolls the book list to the top and register it
+    with the keyboard manager. It has no default key, as T is used by Edit
+    book, the user can assign one in Preferences->Shortcuts.
+    '''
+    ac = QAction(QIcon.ic('top.png'), '置顶', gui)
+    gui.addAction(ac)
+    gui.keyboard.register_shortcut('置顶', '置顶', default_keys=(), action=ac)
+    ac.triggered.connect(gui.library_view.scrollToTop)
+    return ac
 
+
+class ScrollTopButton(QToolButton):
+
+    ' Kept for compatibility, a tool button driven by the scroll to top action '
+
+    def __init__(self, gui):
         QToolButton.__init__(self)
         self.gui = gui
         self.setAutoRaise(True), self.setCursor(Qt.CursorShape.PointingHandCursor)
-        self.setPopupMode(QToolButton.ToolButtonPopupMode.InstantPopup)
         self.setToolButtonStyle(Qt.ToolButtonStyle.ToolButtonIconOnly)
-        self.setIcon(QIcon.ic('top.png'))
-
-        self.action_toggle = QAction(self.icon(),'置顶', self)
-
-        gui.addAction(self.action_toggle)
-        gui.keyboard.register_shortcut('置顶', '置顶',
-                                    default_keys=(sc,), action=self.action_toggle)
-        self.action_toggle.triggered.connect(self.scroll_top)
-        self.clicked.connect(self.scroll_top)
+        self.action_toggle = getattr(gui, 'scroll_top_action', None) or scroll_top_action(gui)
+        self.setDefaultAction(self.action_toggle)
 
     def scroll_top(self):
-        self.gui.library_view.selectRow(0)
-        self.gui.library_view.selectionModel().reset()
+        self.gui.library_view.scrollToTop()
 
 
 class Spacer(QWidget):
 
+    ' Kept for compatibility, prefer QBoxLayout.addSpacing() in new code '
+
     def __init__(self, width=0):
         QWidget.__init__(self)
         self.setFixedWidth(width)
-        self.setHidden(1)
-        self.setVisible(1)
 
 
 class JumpToFolderBox(QDialog):  # {{{
@@ -49,10 +66,13 @@ class JumpToFolderBox(QDialog):  # {{{
     WARNING = 1
     INFO = 2
     QUESTION = 3
+    ICON_NAMES = ('dialog_error.png', 'dialog_warning.png', 'dialog_information.png', 'dialog_question.png')
 
     resize_needed = pyqtSignal()
+    RESIZE_INTERVAL = 50
 
     def setup_ui(self):
+        from calibre.gui2.dialogs.message_box import Icon
         self.setObjectName("Dialog")
         self.resize(497, 235)
         self.gridLayout = l = QGridLayout(self)
@@ -64,7 +84,10 @@ class JumpToFolderBox(QDialog):  # {{{
         la.setOpenExternalLinks(True)
         la.setObjectName("msg")
         l.addWidget(la, 0, 1, 1, 1)
-        self.det_msg = dm = QTextBrowser(self)
+        # The details are usually a plain folder path, so use the lighter
+        # QPlainTextEdit unless they turn out to be rich text, see
+        # render_pending_det_msg()
+        self.det_msg = dm = QPlainTextEdit(self)
         dm.setReadOnly(True)
         dm.setObjectName("det_msg")
         l.addWidget(dm, 1, 0, 1, 2)
@@ -91,26 +114,18 @@ class JumpToFolderBox(QDialog):  # {{{
         self.only_copy_details = only_copy_details
         self.aborted = False
         if q_icon is None:
-            icon = {
-                    self.ERROR : 'error',
-                    self.WARNING: 'warning',
-                    self.INFO:    'information',
-                    self.QUESTION: 'question',
-            }[type_]
-            icon = 'dialog_%s.png'%icon
-            self.icon = QIcon.ic(icon)
+            self.icon = QIcon.cached_icon(self.ICON_NAMES[type_])
         else:
-            self.icon = q_icon if isinstance(q_icon, QIcon) else QIcon.ic(q_icon)
+            self.icon = QIcon.ic(q_icon)
         self.setup_ui()
 
         self.setWindowTitle(title)
         self.setWindowIcon(self.icon)
         self.icon_widget.set_icon(self.icon)
         self.msg.setText(msg)
-        if det_msg and Qt.mightBeRichText(det_msg):
-            self.det_msg.setHtml(det_msg)
-        else:
-            self.det_msg.setPlainText(det_msg)
+        # The details are only rendered when they are first shown, see
+        # toggle_det_msg()
+        self.pending_det_msg = det_msg or ''
         self.det_msg.setVisible(False)
         self.toggle_checkbox.setVisible(False)
 
@@ -126,25 +141,26 @@ class JumpToFolderBox(QDialog):  # {{{
         self.det_msg_toggle.setToolTip(
                 _('Show detailed information about this error'))
 
-        self.copy_action = QAction(self)
-        self.addAction(self.copy_action)
-        self.copy_action.setShortcuts(QKeySequence.StandardKey.Copy)
-        self.copy_action.triggered.connect(self.copy_to_clipboard)
+        # Holding down the copy shortcut must not open the folder repeatedly
+        self.copy_shortcut = sc = QShortcut(QKeySequence.StandardKey.Copy, self)
+        sc.setAutoRepeat(False)
+        sc.activated.connect(self.copy_to_clipboard)
 
         self.is_question = type_ == self.QUESTION
         if self.is_question:
             self.bb.setStandardButtons(QDialogButtonBox.StandardButton.Yes|QDialogButtonBox.StandardButton.No)
-            self.bb.button(QDialogButtonBox.StandardButton.Yes if default_yes else QDialogButtonBox.StandardButton.No
-                    ).setDefault(True)
+            yes_button = self.bb.button(QDialogButtonBox.StandardButton.Yes)
+            no_button = self.bb.button(QDialogButtonBox.StandardButton.No)
+            (yes_button if default_yes else no_button).setDefault(True)
             self.default_yes = default_yes
             if yes_text is not None:
-                self.bb.button(QDialogButtonBox.StandardButton.Yes).setText(yes_text)
+                yes_button.setText(yes_text)
             if no_text is not None:
-                self.bb.button(QDialogButtonBox.StandardButton.No).setText(no_text)
+                no_button.setText(no_text)
             if yes_icon is not None:
-                self.bb.button(QDialogButtonBox.StandardButton.Yes).setIcon(yes_icon if isinstance(yes_icon, QIcon) else QIcon.ic(yes_icon))
+                yes_button.setIcon(QIcon.ic(yes_icon))
             if no_icon is not None:
-                self.bb.button(QDialogButtonBox.StandardButton.No).setIcon(no_icon if isinstance(no_icon, QIcon) else QIcon.ic(no_icon))
+                no_button.setIcon(QIcon.ic(no_icon))
         else:
             self.bb.button(QDialogButtonBox.StandardButton.Ok).setDefault(True)
 
@@ -154,7 +170,12 @@ class JumpToFolderBox(QDialog):  # {{{
         if not det_msg:
             self.det_msg_toggle.setVisible(False)
 
-        self.resize_needed.connect(self.do_resize, type=Qt.ConnectionType.QueuedConnection)
+        # Throttle resize requests, so that a burst of them, for example from
+        # details being updated repeatedly, results in at most one resize
+        # every RESIZE_INTERVAL milliseconds
+        self.resize_timer = t = QTimer(self)
+        t.setSingleShot(True), t.setInterval(self.RESIZE_INTERVAL), t.timeout.connect(self.do_resize)
+        self.resize_needed.connect(self.schedule_resize)
         self.do_resize()
 
     def on_abort(self):
@@ -166,19 +187,39 @@ class JumpToFolderBox(QDialog):  # {{{
         ans.setHeight(min(ans.height(), 500))
         return ans
 
+    def render_pending_det_msg(self):
+        msg, self.pending_det_msg = self.pending_det_msg, None
+        if msg is not None:
+            if '<' in msg and Qt.mightBeRichText(msg):
+                if not isinstance(self.det_msg, QTextBrowser):
+                    old, self.det_msg = self.det_msg, QTextBrowser(self)
+                    self.det_msg.setReadOnly(True)
+                    self.det_msg.setObjectName("det_msg")
+                    self.det_msg.setVisible(old.isVisible())
+                    self.gridLayout.replaceWidget(old, self.det_msg)
+                    old.deleteLater()
+                self.det_msg.setHtml(msg)
+            else:
+                self.det_msg.setPlainText(msg)
+
     def toggle_det_msg(self, *args):
         vis = self.det_msg.isVisible()
+        if not vis:
+            self.render_pending_det_msg()
         self.det_msg.setVisible(not vis)
         self.det_msg_toggle.setText(self.show_det_msg if vis else self.hide_det_msg)
         self.resize_needed.emit()
 
+    def schedule_resize(self):
+        if not self.resize_timer.isActive():
+            self.resize_timer.start()
+
     def do_resize(self):
         self.resize(self.sizeHint())
 
     def copy_to_clipboard(self, *args):
-        file_to_show = self.det_msg.toPlainText()
-        import subprocess
-        subprocess.call(["open", file_to_show])
+        self.render_pending_det_msg()
+        open_local_file(self.det_msg.toPlainText())
 
     def showEvent(self, ev):
         ret = QDialog.showEvent(self, ev)
@@ -195,10 +236,7 @@ class JumpToFolderBox(QDialog):  # {{{
     def set_details(self, msg):
         if not msg:
             msg = ''
-        if Qt.mightBeRichText(msg):
-            self.det_msg.setHtml(msg)
-        else:
-            self.det_msg.setPlainText(msg)
+        self.pending_det_msg = msg
         self.det_msg_toggle.setText(self.show_det_msg)
         self.det_msg_toggle.setVisible(bool(msg))
         self.det_msg.setVisible(False)
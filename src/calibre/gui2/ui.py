@@ -12,10 +12,12 @@ import errno
 import gc
 import os
 import re
+import shutil
 import sys
 import textwrap
 import time
-from collections import OrderedDict, deque
+import traceback
+from collections import deque
 from io import BytesIO
 
 import apsw
@@ -54,6 +56,7 @@ from calibre.gui2.keyboard import Manager
 from calibre.gui2.layout import MainWindowMixin
 from calibre.gui2.listener import Listener
 from calibre.gui2.main_window import MainWindow
+from calibre.gui2.my_customised import scroll_top_action
 from calibre.gui2.open_with import register_keyboard_shortcuts
 from calibre.gui2.proceed import ProceedQuestion
 from calibre.gui2.search_box import SavedSearchBoxMixin, SearchBoxMixin
@@ -64,17 +67,35 @@ from calibre.gui2.widgets import BusyCursor, ProgressIndicator
 from calibre.library import current_library_name
 from calibre.srv.library_broker import GuiLibraryBroker, db_matches
 from calibre.utils.config import dynamic, prefs
-from calibre.utils.ipc.pool import Pool
 from calibre.utils.resources import get_image_path as I
 from calibre.utils.resources import get_path as P
 from polyglot.builtins import string_or_bytes
-from polyglot.queue import Empty, Queue
+
+kfx_url_pat = re.compile(r'(https:\S+)')
+location_pages = {'library': 0, 'main': 1, 'carda': 2}
+url_item_pat = re.compile(r'(?:id_(\d+)|hex_([0-9a-fA-F]+)|val_(.*))\Z', re.DOTALL)
 
 
 def get_gui():
     return getattr(get_gui, 'ans', None)
 
 
+def url_path_parts(path, num):
+    ' The non-empty components of path, or None if there are not exactly num of them '
+    parts = [x for x in path.split('/') if x]
+    return parts if len(parts) == num else None
+
+
+def virtual_library_from_url_query(query):
+    vl = query.get('encoded_virtual_library')
+    if vl:
+        vl = bytes.fromhex(vl[0]).decode('utf-8')
+    else:
+        vl = query.get('virtual_library')
+        vl = vl[0] if vl else None
+    return None if vl == '-' else vl
+
+
 def add_quick_start_guide(library_view, refresh_cover_browser=None):
     from calibre.ebooks.covers import calibre_cover2
     from calibre.ebooks.metadata.meta import get_metadata
@@ -85,18 +106,18 @@ def add_quick_start_guide(library_view, refresh_cover_browser=None):
     gprefs['quick_start_guide_added'] = True
     imgbuf = BytesIO(calibre_cover2(_('Quick Start Guide'), ''))
     try:
-        with open(P('quick_start/%s.epub' % l), 'rb') as src:
-            buf = BytesIO(src.read())
+        src = open(P('quick_start/%s.epub' % l), 'rb')
     except OSError as err:
         if err.errno != errno.ENOENT:
             raise
-        with open(P('quick_start/eng.epub'), 'rb') as src:
-            buf = BytesIO(src.read())
-    safe_replace(buf, 'images/cover.jpg', imgbuf)
-    buf.seek(0)
-    mi = get_metadata(buf, 'epub')
-    with PersistentTemporaryFile('.epub') as tmp:
-        tmp.write(buf.getvalue())
+        src = open(P('quick_start/eng.epub'), 'rb')
+    # Work on the temporary file directly rather than on in memory copies
+    with src, PersistentTemporaryFile('.epub') as tmp:
+        shutil.copyfileobj(src, tmp)
+        tmp.seek(0)
+        safe_replace(tmp, 'images/cover.jpg', imgbuf)
+        tmp.seek(0)
+        mi = get_metadata(tmp, 'epub')
     library_view.model().add_books([tmp.name], ['epub'], [mi])
     os.remove(tmp.name)
     library_view.model().books_added(1)
@@ -137,29 +158,33 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
         self.opts = opts
         self.device_connected = None
         self.gui_debug = gui_debug
-        self.iactions = OrderedDict()
+        self.iactions = {}
+        BUILTIN, ignore_plugins = PluginInstallationType.BUILTIN, opts.ignore_plugins
         # Actions
         for action in interface_actions():
-            if opts.ignore_plugins \
-                    and action.installation_type is not PluginInstallationType.BUILTIN:
+            if ignore_plugins and action.installation_type is not BUILTIN:
                 continue
             try:
                 ac = self.init_iaction(action)
             except Exception:
                 # Ignore errors in loading user supplied plugins
-                import traceback
                 try:
                     traceback.print_exc()
                 except Exception:
                     if action.plugin_path:
                         print('Failed to load Interface Action plugin:', action.plugin_path, file=sys.stderr)
-                if action.installation_type is PluginInstallationType.BUILTIN:
+                if action.installation_type is BUILTIN:
                     raise
                 continue
-            ac.plugin_path = action.plugin_path
-            ac.interface_action_base_plugin = action
             self.add_iaction(ac)
-        self.load_store_plugins()
+        # The store plugins are only needed once the user uses Get books, so
+        # they are loaded after the main window is shown, see
+        # initialize_store_plugins()
+        from calibre.gui2.store.loader import Stores
+        self.istores = Stores()
+        # Initialize the empty placeholder, so that it can be used before the
+        # stores are loaded
+        self.istores.builtins_loaded()
 
     def init_iaction(self, action):
         ac = action.load_actual_plugin(self)
@@ -180,22 +205,31 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
     def load_store_plugins(self):
         from calibre.gui2.store.loader import Stores
         self.istores = Stores()
+        BUILTIN, ignore_plugins = PluginInstallationType.BUILTIN, self.opts.ignore_plugins
         for store in available_store_plugins():
-            if self.opts.ignore_plugins \
-                    and store.installation_type is not PluginInstallationType.BUILTIN:
+            if ignore_plugins and store.installation_type is not BUILTIN:
                 continue
             try:
                 st = self.init_istore(store)
                 self.add_istore(st)
             except:
                 # Ignore errors in loading user supplied plugins
-                import traceback
                 traceback.print_exc()
-                if store.installation_type is PluginInstallationType.BUILTIN:
+                if store.installation_type is BUILTIN:
                     raise
                 continue
         self.istores.builtins_loaded()
 
+    def initialize_store_plugins(self):
+        self.load_store_plugins()
+        for st in self.istores.values():
+            st.do_genesis()
+        if 'Store' in self.iactions:
+            self.iactions['Store'].load_menu()
+        # Store plugins can register shortcuts in genesis(), which now runs
+        # after initialize() has called finalize()
+        self.keyboard.finalize()
+
     def init_istore(self, store):
         st = store.load_actual_plugin(self)
         st.plugin_path = store.plugin_path
@@ -226,8 +260,12 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
         self.library_broker = GuiLibraryBroker(db)
         self.content_server = None
         self.server_change_notification_timer = t = QTimer(self)
-        self.server_changes = Queue()
+        # Only accessed from the GUI thread, as handle_changes_from_server()
+        # is called via a Dispatcher
+        self.server_changes = []
         t.setInterval(1000), t.timeout.connect(self.handle_changes_from_server_debounced), t.setSingleShot(True)
+        self.library_changed_gc_timer = t = QTimer(self)
+        t.setInterval(500), t.timeout.connect(gc.collect), t.setSingleShot(True)
         self._spare_pool = None
         self.must_restart_before_config = False
 
@@ -236,14 +274,12 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
                 ac.do_genesis()
             except Exception:
                 # Ignore errors in third party plugins
-                import traceback
                 traceback.print_exc()
                 if getattr(ac, 'installation_type', None) is PluginInstallationType.BUILTIN:
                     raise
         self.donate_action = QAction(QIcon.ic('donate.png'),
                 _('&Donate to support calibre'), self)
-        for st in self.istores.values():
-            st.do_genesis()
+        QTimer.singleShot(0, self.initialize_store_plugins)
         MainWindowMixin.init_main_window_mixin(self)
 
         # Jobs Button {{{
@@ -301,33 +337,20 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
                 default_keys=(), action=self.minimize_action)
         self.minimize_action.triggered.connect(self.showMinimized)
 
-        self.esc_action = QAction(self)
-        self.addAction(self.esc_action)
-        self.keyboard.register_shortcut('clear current search',
-                _('Clear the current search'), default_keys=('Esc',),
-                action=self.esc_action)
-        self.esc_action.triggered.connect(self.esc)
-
-        self.shift_esc_action = QAction(self)
-        self.addAction(self.shift_esc_action)
-        self.keyboard.register_shortcut('focus book list',
-                _('Focus the book list'), default_keys=('Shift+Esc',),
-                action=self.shift_esc_action)
-        self.shift_esc_action.triggered.connect(self.shift_esc)
-
-        self.ctrl_esc_action = QAction(self)
-        self.addAction(self.ctrl_esc_action)
-        self.keyboard.register_shortcut('clear virtual library',
-                _('Clear the Virtual library'), default_keys=('Ctrl+Esc',),
-                action=self.ctrl_esc_action)
-        self.ctrl_esc_action.triggered.connect(self.ctrl_esc)
-
-        self.alt_esc_action = QAction(self)
-        self.addAction(self.alt_esc_action)
-        self.keyboard.register_shortcut('clear additional restriction',
-                _('Clear the additional restriction'), default_keys=('Alt+Esc',),
-                action=self.alt_esc_action)
-        self.alt_esc_action.triggered.connect(self.clear_additional_restriction)
+        for attr, unique_name, name, keys, slot in (
+            ('esc_action', 'clear current search', _('Clear the current search'), ('Esc',), self.esc),
+            ('shift_esc_action', 'focus book list', _('Focus the book list'), ('Shift+Esc',), self.shift_esc),
+            ('ctrl_esc_action', 'clear virtual library', _('Clear the Virtual library'), ('Ctrl+Esc',), self.ctrl_esc),
+            ('alt_esc_action', 'clear additional restriction', _('Clear the additional restriction'), ('Alt+Esc',),
+             self.clear_additional_restriction),
+        ):
+            ac = QAction(self)
+            setattr(self, attr, ac)
+            self.addAction(ac)
+            self.keyboard.register_shortcut(unique_name, name, default_keys=keys, action=ac)
+            ac.triggered.connect(slot)
+
+        self.scroll_top_action = scroll_top_action(self)
 
         # ###################### Start spare job server ########################
         QTimer.singleShot(1000, self.create_spare_pool)
@@ -356,7 +379,6 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
             try:
                 add_quick_start_guide(self.library_view)
             except:
-                import traceback
                 traceback.print_exc()
         for view in ('library', 'memory', 'card_a', 'card_b'):
             v = getattr(self, '%s_view' % view)
@@ -391,7 +413,6 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
             try:
                 ac.gui_layout_complete()
             except:
-                import traceback
                 traceback.print_exc()
                 if ac.installation_type is PluginInstallationType.BUILTIN:
                     raise
@@ -421,7 +442,6 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
             try:
                 ac.initialization_complete()
             except:
-                import traceback
                 traceback.print_exc()
                 if ac.installation_type is PluginInstallationType.BUILTIN:
                     raise
@@ -488,7 +508,6 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
                 except Exception as e:
                     message = str(e)
                     timed_print(f'Starting smartdevice driver failed: {message}')
-                    import traceback
                     traceback.print_exc()
         if message:
             if not self.device_manager.is_running('Wireless Devices'):
@@ -523,20 +542,15 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
         if DEBUG:
             prints(f'Received server change event: {change_event} for {library_path}')
         if self.library_broker.is_gui_library(library_path):
-            self.server_changes.put((library_path, change_event))
+            self.server_changes.append((library_path, change_event))
             self.server_change_notification_timer.start()
 
     def handle_changes_from_server_debounced(self):
         if self.shutting_down:
             return
-        changes = []
-        while True:
-            try:
-                library_path, change_event = self.server_changes.get_nowait()
-            except Empty:
-                break
-            if self.library_broker.is_gui_library(library_path):
-                changes.append(change_event)
+        pending, self.server_changes = self.server_changes, []
+        is_gui_library = self.library_broker.is_gui_library
+        changes = [change_event for library_path, change_event in pending if is_gui_library(library_path)]
         if changes:
             handle_changes(changes, self)
 
@@ -552,6 +566,7 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
 
     def create_spare_pool(self, *args):
         if self._spare_pool is None:
+            from calibre.utils.ipc.pool import Pool
             num = min(detect_ncpus(), config['worker_limit']//2)
             self._spare_pool = Pool(max_workers=num, name='GUIPool')
 
@@ -647,6 +662,14 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
         if isinstance(args, string_or_bytes):
             args = [args]
         files, urls = [], []
+
+        def add_file(path):
+            a = os.path.abspath(path)
+            # Check access first as it fails without a second stat() for
+            # files that do not exist
+            if os.access(a, os.R_OK) and not os.path.isdir(a):
+                files.append(a)
+
         for p in args:
             if p.startswith('calibre://'):
                 try:
@@ -654,7 +677,7 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
                     if purl.scheme == 'calibre':
                         action = purl.netloc
                         path = unquote(purl.path)
-                        query = parse_qs(unquote(purl.query))
+                        query = parse_qs(unquote(purl.query)) if purl.query else {}
                         urls.append((action, path, query))
                 except Exception:
                     prints('Ignoring malformed URL:', p, file=sys.stderr)
@@ -663,17 +686,12 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
                 try:
                     purl = urlparse(p)
                     if purl.scheme == 'file':
-                        path = unquote(purl.path)
-                        a = os.path.abspath(path)
-                        if not os.path.isdir(a) and os.access(a, os.R_OK):
-                            files.append(a)
+                        add_file(unquote(purl.path))
                 except Exception:
                     prints('Ignoring malformed URL:', p, file=sys.stderr)
                     continue
             else:
-                a = os.path.abspath(p)
-                if not os.path.isdir(a) and os.access(a, os.R_OK):
-                    files.append(a)
+                add_file(p)
         if files:
             self.iactions['Add Books'].add_filesystem_book(files)
         if urls:
@@ -683,170 +701,171 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
             QTimer.singleShot(10, doit)
 
     def handle_url_action(self, action, path, query):
+        handler = self.URL_ACTIONS.get(action)
+        if handler is not None:
+            handler(self, path, query)
+
+    def decode_library_id(self, x):
+        if x == '_':
+            return getattr(self.current_db.new_api, 'server_library_id', None) or '_'
+        if x.startswith('_hex_-'):
+            return bytes.fromhex(x[6:]).decode('utf-8')
+        return x
+
+    def resolve_url_library(self, library_id):
+        ' Return the decoded library id and the path of the library it refers to, or None '
+        library_id = self.decode_library_id(library_id)
+        return library_id, self.library_broker.path_for_library_id(library_id)
+
+    def url_switch_library(self, path, query):
         import posixpath
+        library_id, library_path = self.resolve_url_library(posixpath.basename(path))
+        if not db_matches(self.current_db, library_id, library_path):
+            self.library_moved(library_path)
 
-        def decode_library_id(x):
-            if x == '_':
-                return getattr(self.current_db.new_api, 'server_library_id', None) or '_'
-            if x.startswith('_hex_-'):
-                return bytes.fromhex(x[6:]).decode('utf-8')
-            return x
-
-        def get_virtual_library(query):
-            vl = None
-            if query.get('encoded_virtual_library'):
-                vl = bytes.fromhex(query.get('encoded_virtual_library')[0]).decode('utf-8')
-            elif query.get('virtual_library'):
-                vl = query.get('virtual_library')[0]
-            if vl == '-':
-                vl = None
-            return vl
-
-        if action == 'switch-library':
-            library_id = decode_library_id(posixpath.basename(path))
-            library_path = self.library_broker.path_for_library_id(library_id)
-            if not db_matches(self.current_db, library_id, library_path):
-                self.library_moved(library_path)
-        elif action == 'book-details':
-            parts = tuple(filter(None, path.split('/')))
-            if len(parts) != 2:
-                return
-            library_id, book_id = parts
-            library_id = decode_library_id(library_id)
-            library_path = self.library_broker.path_for_library_id(library_id)
-            if library_path is None:
-                prints('Ignoring unknown library id', library_id, file=sys.stderr)
-                return
+    def url_book_details(self, path, query):
+        parts = url_path_parts(path, 2)
+        if parts is None:
+            return
+        library_id, book_id = parts
+        library_id, library_path = self.resolve_url_library(library_id)
+        if library_path is None:
+            prints('Ignoring unknown library id', library_id, file=sys.stderr)
+            return
+        try:
+            book_id = int(book_id)
+        except Exception:
+            prints('Ignoring invalid book id', book_id, file=sys.stderr)
+            return
+        details = self.iactions['Show Book Details']
+        details.show_book_info(library_id=library_id, library_path=library_path, book_id=book_id)
+
+    def url_show_note(self, path, query):
+        parts = url_path_parts(path, 3)
+        if parts is None:
+            return
+        library_id, field, itemx = parts
+        library_id, library_path = self.resolve_url_library(library_id)
+        if library_path is None:
+            prints('Ignoring unknown library id', library_id, file=sys.stderr)
+            return
+        if field.startswith('_'):
+            field = '#' + field[1:]
+        m = url_item_pat.match(itemx)
+        if m is None:
+            prints('Ignoring invalid item', itemx, file=sys.stderr)
+            return
+        item_id, item_hexval, item_val = m.groups()
+        if item_id is not None:
+            item_id = int(item_id)
+        elif item_hexval is not None:
             try:
-                book_id = int(book_id)
+                item_val = bytes.fromhex(item_hexval).decode('utf-8')
             except Exception:
-                prints('Ignoring invalid book id', book_id, file=sys.stderr)
-                return
-            details = self.iactions['Show Book Details']
-            details.show_book_info(library_id=library_id, library_path=library_path, book_id=book_id)
-        elif action == 'show-note':
-            parts = tuple(filter(None, path.split('/')))
-            if len(parts) != 3:
-                return
-            library_id, field, itemx = parts
-            library_id = decode_library_id(library_id)
-            library_path = self.library_broker.path_for_library_id(library_id)
-            if library_path is None:
-                prints('Ignoring unknown library id', library_id, file=sys.stderr)
-                return
-            if field.startswith('_'):
-                field = '#' + field[1:]
-            item_id = item_val = None
-            if itemx.startswith('id_'):
-                try:
-                    item_id = int(itemx[3:])
-                except Exception:
-                    prints('Ignoring invalid item id', itemx, file=sys.stderr)
-                    return
-            elif itemx.startswith('hex_'):
-                try:
-                    item_val = bytes.fromhex(itemx[4:]).decode('utf-8')
-                except Exception:
-                    prints('Ignoring invalid item hexval', itemx, file=sys.stderr)
-                    return
-            elif itemx.startswith('val_'):
-                item_val = itemx[4:]
-            else:
                 prints('Ignoring invalid item hexval', itemx, file=sys.stderr)
                 return
 
-            def doit():
-                nonlocal item_id, item_val
-                db = self.current_db.new_api
+        def doit():
+            nonlocal item_id, item_val
+            db = self.current_db.new_api
+            if item_id is None:
+                item_id = db.get_item_id(field, item_val)
                 if item_id is None:
-                    item_id = db.get_item_id(field, item_val)
-                    if item_id is None:
-                        prints('The item named:', item_val, 'was not found', file=sys.stderr)
-                        return
-                if db.notes_for(field, item_id):
-                    from calibre.gui2.dialogs.show_category_note import ShowNoteDialog
-                    ShowNoteDialog(field, item_id, db, parent=self).show()
-                else:
-                    prints(f'No notes available for {field}:{itemx}', file=sys.stderr)
+                    prints('The item named:', item_val, 'was not found', file=sys.stderr)
+                    return
+            if db.notes_for(field, item_id):
+                from calibre.gui2.dialogs.show_category_note import ShowNoteDialog
+                ShowNoteDialog(field, item_id, db, parent=self).show()
+            else:
+                prints(f'No notes available for {field}:{itemx}', file=sys.stderr)
 
-            self.perform_url_action(library_id, library_path, doit)
-        elif action == 'show-book':
-            parts = tuple(filter(None, path.split('/')))
-            if len(parts) != 2:
-                return
-            library_id, book_id = parts
-            library_id = decode_library_id(library_id)
-            try:
-                book_id = int(book_id)
-            except Exception:
-                prints('Ignoring invalid book id', book_id, file=sys.stderr)
-                return
-            library_path = self.library_broker.path_for_library_id(library_id)
-            if library_path is None:
-                return
-            vl = get_virtual_library(query)
+        self.perform_url_action(library_id, library_path, doit)
 
-            def doit():
-                # To maintain compatibility, don't change the VL if it isn't specified.
-                if vl is not None and vl != '_':
-                    self.apply_virtual_library(vl)
+    def url_show_book(self, path, query):
+        parts = url_path_parts(path, 2)
+        if parts is None:
+            return
+        library_id, book_id = parts
+        try:
+            book_id = int(book_id)
+        except Exception:
+            prints('Ignoring invalid book id', book_id, file=sys.stderr)
+            return
+        library_id, library_path = self.resolve_url_library(library_id)
+        if library_path is None:
+            return
+        vl = virtual_library_from_url_query(query)
+
+        def doit():
+            # To maintain compatibility, don't change the VL if it isn't specified.
+            if vl is not None and vl != '_':
+                self.apply_virtual_library(vl)
+            rows = self.library_view.select_rows((book_id,))
+            if not rows:
+                self.search.set_search_string('')
                 rows = self.library_view.select_rows((book_id,))
-                if not rows:
-                    self.search.set_search_string('')
-                    rows = self.library_view.select_rows((book_id,))
-                db = self.current_db
-                if not rows and (db.data.get_base_restriction_name() or db.data.get_search_restriction_name()):
-                    self.apply_virtual_library()
-                    self.apply_named_search_restriction()
-                    self.library_view.select_rows((book_id,))
-
-            self.perform_url_action(library_id, library_path, doit)
-        elif action == 'view-book':
-            parts = tuple(filter(None, path.split('/')))
-            if len(parts) != 3:
-                return
-            library_id, book_id, fmt = parts
-            library_id = decode_library_id(library_id)
-            try:
-                book_id = int(book_id)
-            except Exception:
-                prints('Ignoring invalid book id', book_id, file=sys.stderr)
-                return
-            library_path = self.library_broker.path_for_library_id(library_id)
-            if library_path is None:
-                return
-            view = self.iactions['View']
+            db = self.current_db
+            if not rows and (db.data.get_base_restriction_name() or db.data.get_search_restriction_name()):
+                self.apply_virtual_library()
+                self.apply_named_search_restriction()
+                self.library_view.select_rows((book_id,))
 
-            def doit():
-                at = query.get('open_at') or None
-                if at:
-                    at = at[0]
-                view.view_format_by_id(book_id, fmt.upper(), open_at=at)
-
-            self.perform_url_action(library_id, library_path, doit)
-        elif action == 'search':
-            parts = tuple(filter(None, path.split('/')))
-            if len(parts) != 1:
-                return
-            library_id = decode_library_id(parts[0])
-            library_path = self.library_broker.path_for_library_id(library_id)
-            if library_path is None:
-                return
-            sq = query.get('eq')
-            if sq:
-                sq = bytes.fromhex(sq[0]).decode('utf-8')
-            else:
-                sq = query.get('q')
-                if sq:
-                    sq = sq[0]
-            sq = sq or ''
-            vl = get_virtual_library(query)
+        self.perform_url_action(library_id, library_path, doit)
 
-            def doit():
-                if vl != '_':
-                    self.apply_virtual_library(vl)
-                self.search.set_search_string(sq)
-            self.perform_url_action(library_id, library_path, doit)
+    def url_view_book(self, path, query):
+        parts = url_path_parts(path, 3)
+        if parts is None:
+            return
+        library_id, book_id, fmt = parts
+        try:
+            book_id = int(book_id)
+        except Exception:
+            prints('Ignoring invalid book id', book_id, file=sys.stderr)
+            return
+        library_id, library_path = self.resolve_url_library(library_id)
+        if library_path is None:
+            return
+        view = self.iactions['View']
+
+        def doit():
+            at = query.get('open_at') or None
+            if at:
+                at = at[0]
+            view.view_format_by_id(book_id, fmt.upper(), open_at=at)
+
+        self.perform_url_action(library_id, library_path, doit)
+
+    def url_search(self, path, query):
+        parts = url_path_parts(path, 1)
+        if parts is None:
+            return
+        library_id, library_path = self.resolve_url_library(parts[0])
+        if library_path is None:
+            return
+        sq = query.get('eq')
+        if sq:
+            sq = bytes.fromhex(sq[0]).decode('utf-8')
+        else:
+            sq = query.get('q')
+            if sq:
+                sq = sq[0]
+        sq = sq or ''
+        vl = virtual_library_from_url_query(query)
+
+        def doit():
+            if vl != '_':
+                self.apply_virtual_library(vl)
+            self.search.set_search_string(sq)
+        self.perform_url_action(library_id, library_path, doit)
+
+    URL_ACTIONS = {
+        'switch-library': url_switch_library,
+        'book-details': url_book_details,
+        'show-note': url_show_note,
+        'show-book': url_show_book,
+        'view-book': url_view_book,
+        'search': url_search,
+    }
 
     def perform_url_action(self, library_id, library_path, func):
         if not db_matches(self.current_db, library_id, library_path):
@@ -858,10 +877,13 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
     def message_from_another_instance(self, msg):
         if isinstance(msg, bytes):
             msg = msg.decode('utf-8', 'replace')
-        if msg.startswith('launched:'):
+        kind, sep, payload = msg.partition(':')
+        if not sep:
+            kind = None
+        if kind == 'launched':
             import json
             try:
-                argv = json.loads(msg[len('launched:'):])
+                argv = json.loads(payload)
             except ValueError:
                 prints('Failed to decode message from other instance: %r' % msg)
                 if DEBUG:
@@ -876,10 +898,10 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
             self.show_windows()
             self.raise_and_focus()
             self.activateWindow()
-        elif msg.startswith('shutdown:'):
+        elif kind == 'shutdown':
             self.quit(confirm_quit=False)
-        elif msg.startswith('bookedited:'):
-            parts = msg.split(':')[1:]
+        elif kind == 'bookedited':
+            parts = payload.split(':')
             try:
                 book_id, fmt, library_id = parts[:3]
                 book_id = int(book_id)
@@ -892,14 +914,14 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
                     m.refresh_ids((book_id,))
                     db.event_dispatcher(db.EventType.book_edited, book_id, fmt)
             except Exception:
-                import traceback
                 traceback.print_exc()
-        elif msg.startswith('web-store:'):
+        elif kind == 'web-store':
             import json
             try:
-                data = json.loads(msg[len('web-store:'):])
+                data = json.loads(payload)
             except ValueError:
                 prints('Failed to decode message from other instance: %r' % msg)
+                return
             path = data['path']
             if data['tags']:
                 before = self.current_db.new_api.all_book_ids()
@@ -917,14 +939,8 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
     def current_view(self):
         '''Convenience method that returns the currently visible view '''
         idx = self.stack.currentIndex()
-        if idx == 0:
-            return self.library_view
-        if idx == 1:
-            return self.memory_view
-        if idx == 2:
-            return self.card_a_view
-        if idx == 3:
-            return self.card_b_view
+        if 0 <= idx < len(self.stack_views):
+            return self.stack_views[idx]
 
     def show_library_view(self):
         self.location_manager.library_action.trigger()
@@ -952,7 +968,6 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
                 except apsw.Error:
                     if not allow_rebuild:
                         raise
-                    import traceback
                     repair = question_dialog(self, _('Corrupted database'),
                             _('The library database at %s appears to be corrupted. Do '
                             'you want calibre to try and rebuild it automatically? '
@@ -972,7 +987,6 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
                 try:
                     action.library_about_to_change(olddb, db)
                 except Exception:
-                    import traceback
                     traceback.print_exc()
             self.library_path = newloc
             self.extra_files_watcher.clear()
@@ -998,7 +1012,6 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
                 try:
                     action.library_changed(db)
                 except Exception:
-                    import traceback
                     traceback.print_exc()
             self.library_broker.gui_library_changed(db, olddb)
             if self.device_connected:
@@ -1010,9 +1023,10 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
             self.set_current_library_information(current_library_name(), db.library_id,
                                                 db.field_metadata)
             self.library_view.set_current_row(0)
-        # Run a garbage collection now so that it does not freeze the
-        # interface later
-        gc.collect()
+        # Run a garbage collection soon so that it does not freeze the
+        # interface later. It is delayed so that several library switches in
+        # quick succession result in a single collection.
+        self.library_changed_gc_timer.start()
 
     def set_window_title(self):
         db = self.current_db
@@ -1033,7 +1047,7 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
         '''
         Called when a location icon is clicked (e.g. Library)
         '''
-        page = 0 if location == 'library' else 1 if location == 'main' else 2 if location == 'carda' else 3
+        page = location_pages.get(location, 3)
         self.stack.setCurrentIndex(page)
         self.book_details.reset_info()
         self.layout_container.tag_browser_button.setEnabled(location == 'library')
@@ -1102,8 +1116,8 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
                     title = job.description.split(':')[-1].partition('(')[-1][:-1]
                     msg = _('<p><b>Failed to convert: %s') % title
                     idx = job.details.index('calibre.ebooks.mobi.reader.mobi6.KFXError:')
-                    msg += '<p>' + re.sub(r'(https:\S+)', r'<a href="\1">{}</a>'.format(_('here')),
-                                          job.details[idx:].partition(':')[2].strip())
+                    msg += '<p>' + kfx_url_pat.sub(r'<a href="\1">{}</a>'.format(_('here')),
+                                                   job.details[idx:].partition(':')[2].strip())
                     d = error_dialog(self, _('Conversion failed'), msg, det_msg=job.details)
                     d.setModal(False)
                     d.show()
@@ -1171,7 +1185,6 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
         try:
             self.shutdown()
         except:
-            import traceback
             traceback.print_exc()
         self.restart_after_quit = restart
         self.debug_on_restart = debug_on_restart
@@ -1250,7 +1263,6 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
         # Do not report any errors that happen after the shutdown
         # We cannot restore the original excepthook as that causes PyQt to
         # call abort() on unhandled exceptions
-        import traceback
 
         def eh(t, v, tb):
             try:
@@ -1322,7 +1334,6 @@ class Main(MainWindow, MainWindowMixin, DeviceMixin, EmailMixin,  # {{{
                 try:
                     self.shutdown(write_settings=False)
                 except:
-                    import traceback
                     traceback.print_exc()
                 e.accept()
             else: